@@ -1,41 +1,124 @@
 import os
-from flask import Flask, request, jsonify, render_template
+import sys
+import gzip
+import zlib
+import hashlib
+import tempfile
+import threading
+import functools
+import diskcache
+from flask import Flask, Response, request, jsonify, render_template
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
+from flask_caching import Cache
+from flask_compress import Compress
 from kerykeion import AstrologicalSubject, KerykeionChartSVG
-import json
+import orjson
 import logging
 import pytz
+import numpy as np
+import swisseph as swe
 from datetime import datetime
+from typing import Optional
+from pydantic import BaseModel, ValidationError, conint
+
+
+class OrjsonProvider(JSONProvider):
+    """使用 orjson 序列化所有 jsonify() 响应"""
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=self.option).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, option=self.option), mimetype='application/json')
+
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app, resources={r"/*": {"origins": ["https://www.yourluckycompass.com"]}})
 
+# 响应 gzip 压缩（SVG 文本压缩率很高）
+app.config['COMPRESS_MIMETYPES'] = ['application/json', 'image/svg+xml', 'text/html']
+app.config['COMPRESS_LEVEL'] = 6
+Compress(app)
+
+# 星盘结果缓存（生产环境可设置 CACHE_TYPE=RedisCache 与 CACHE_REDIS_URL）
+cache = Cache(app, config={
+    'CACHE_TYPE': os.environ.get('CACHE_TYPE', 'SimpleCache'),
+    'CACHE_REDIS_URL': os.environ.get('CACHE_REDIS_URL'),
+    'CACHE_DEFAULT_TIMEOUT': 86400
+})
+
 # 设置日志
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
 logger = logging.getLogger(__name__)
 
+# SVG 磁盘缓存（跨进程/重启复用，zlib 压缩存储）
+# 默认容量 256 MB，低于 Vercel /tmp 的 512 MB 上限；缓存不可用时只记录日志，不影响出图
+try:
+    svg_cache = diskcache.Cache(
+        os.environ.get('SVG_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'svg_cache')),
+        size_limit=int(os.environ.get('SVG_CACHE_SIZE_LIMIT', 256 * 2 ** 20))
+    )
+except Exception as e:
+    logger.error(f"Failed to open SVG disk cache: {e}")
+    svg_cache = None
+
+def _svg_cache_get(svg_key):
+    if svg_cache is None:
+        return None
+    try:
+        svg_blob = svg_cache.get(svg_key)
+        return zlib.decompress(svg_blob).decode('utf-8') if svg_blob is not None else None
+    except Exception as e:
+        logger.warning(f"SVG cache read failed: {e}")
+        return None
+
+def _svg_cache_set(svg_key, svg_data):
+    if svg_cache is None:
+        return
+    try:
+        svg_cache.set(svg_key, zlib.compress(svg_data.encode('utf-8')))
+    except Exception as e:
+        logger.warning(f"SVG cache write failed: {e}")
+
 # 加载解读模板
 try:
-    with open('interpretations.json', 'r', encoding='utf-8') as f:
-        interpretations = json.load(f)
+    with open('interpretations.json', 'rb') as f:
+        interpretations = orjson.loads(f.read())
 except FileNotFoundError:
     logger.error("interpretations.json not found. Please create it in the project directory.")
     interpretations = {"planets_in_houses": {}, "aspects": {}}
-except json.JSONDecodeError as e:
+except orjson.JSONDecodeError as e:
     logger.error(f"Failed to parse interpretations.json: {e}")
     interpretations = {"planets_in_houses": {}, "aspects": {}}
 
 # 加载城市数据
 try:
-    with open('city_data.json', 'r', encoding='utf-8') as f:
-        city_data = json.load(f)
+    with open('city_data.json', 'rb') as f:
+        city_data = orjson.loads(f.read())
 except FileNotFoundError:
     logger.error("city_data.json not found. Please create it in the project directory.")
     city_data = {}
-except json.JSONDecodeError as e:
+except orjson.JSONDecodeError as e:
     logger.error(f"Failed to parse city_data.json: {e}")
     city_data = {}
 
+# 按 (州, 城市) 预建索引，请求时 O(1) 查找
+city_index = {
+    country: {(c['state'], c['city']): c for c in cities}
+    for country, cities in city_data.items()
+}
+
+# 城市数据是静态的：启动时序列化一次（含 gzip 版本）
+_cities_blob = orjson.dumps(city_data)
+_cities_gz = gzip.compress(_cities_blob)
+
 # UTC 偏移到 pytz 时区的映射
 utc_to_pytz = {
     # 7 国常用时区（城市选择模式）
@@ -73,10 +156,28 @@ utc_to_pytz = {
     '14': 'Pacific/Kiritimati'  # Line Islands
 }
 
+# 启动时预先解析 pytz 时区对象，请求中只需查表
+utc_to_tz = {}
+for offset, tz_name in utc_to_pytz.items():
+    try:
+        utc_to_tz[offset] = pytz.timezone(tz_name)
+    except pytz.exceptions.UnknownTimeZoneError:
+        logger.error(f"Invalid pytz timezone for offset {offset}: {tz_name}")
+
+# 时区名称到预解析时区对象的映射（星盘缓存键中保存的是时区名称）
+zone_to_tz = {tz.zone: tz for tz in utc_to_tz.values()}
+
 # 获取城市数据路由
 @app.route('/get-cities', methods=['GET'])
 def get_cities():
-    return jsonify(city_data)
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response = Response(_cities_gz, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(_cities_blob, mimetype='application/json')
+    response.headers['Cache-Control'] = 'public, max-age=86400'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
 
 # 主页路由
 @app.route('/')
@@ -84,229 +185,430 @@ def get_cities():
 def index():
     return render_template('index.html')
 
-@app.route('/generate-chart', methods=['POST'])
-def generate_chart():
-    try:
-        # 接收前端信息
-        data = request.json
-        name = data.get('name', 'User')
-        year = data.get('year')
-        month = data.get('month')
-        day = data.get('day')
-        hour = data.get('hour')
-        minute = data.get('minute')
-        input_method = data.get('input_method', 'city')
-        city = data.get('city')
-        state = data.get('state')
-        country = data.get('country')
-        latitude = data.get('latitude')
-        longitude = data.get('longitude')
-        timezone = data.get('timezone')  # UTC 偏移值（如 '-5'）
-
-        # 验证年份、月份、日期和时间
-        if not (1900 <= year <= 2025):
-            return jsonify({'success': False, 'error': 'Year must be between 1900 and 2025'})
-        if not (1 <= month <= 12):
-            return jsonify({'success': False, 'error': 'Month must be between 1 and 12'})
-        if not (1 <= day <= 31):
-            return jsonify({'success': False, 'error': 'Day must be between 1 and 31'})
-        if not (0 <= hour <= 23):
-            return jsonify({'success': False, 'error': 'Hour must be between 0 and 23'})
-        if not (0 <= minute <= 59):
-            return jsonify({'success': False, 'error': 'Minute must be between 0 and 59'})
-
-        # 验证日期有效性
-        try:
-            datetime(year, month, day)
-        except ValueError:
-            return jsonify({'success': False, 'error': 'Invalid date'})
-
-        # 处理位置信息
-        if input_method == 'manual':
-            if latitude is None or longitude is None or not timezone:
-                return jsonify({'success': False, 'error': 'Latitude, longitude, and timezone are required for manual input'})
-            if not (-90 <= latitude <= 90):
-                return jsonify({'success': False, 'error': 'Latitude must be between -90 and 90'})
-            if not (-180 <= longitude <= 180):
-                return jsonify({'success': False, 'error': 'Longitude must be between -180 and 180'})
+# AstrologicalSubject 上的行星属性（按输出顺序）
+PLANET_ATTRS = ('sun', 'moon', 'mercury', 'venus', 'mars', 'jupiter', 'saturn', 'uranus', 'neptune', 'pluto')
+
+# 输出用的名称常量统一驻留（sys.intern），每次请求复用同一字符串对象
+# 上升点与行星名称（上升点在前，其余与 PLANET_ATTRS 顺序一致）
+PLANET_NAMES = tuple(sys.intern(name) for name in ('Ascendant',) + tuple(attr.capitalize() for attr in PLANET_ATTRS))
+
+# 宫位名称前缀到标准名称的映射
+HOUSE_NAMES = {prefix: sys.intern(f'{prefix}_House') for prefix in (
+    'First', 'Second', 'Third', 'Fourth', 'Fifth', 'Sixth',
+    'Seventh', 'Eighth', 'Ninth', 'Tenth', 'Eleventh', 'Twelfth'
+)}
+
+# 宫位标准名称到展示名称的映射（'First_House' -> 'First House'）
+DISPLAY_HOUSE = {house: sys.intern(house.replace('_House', ' House')) for house in HOUSE_NAMES.values()}
+
+# 手动相位计算：相位类型及其中心角度（容许度 10°）
+ASPECT_CENTERS = (('conjunct', 0), ('opposition', 180), ('square', 90), ('trine', 120), ('sextile', 60))
+ASPECT_ORB = 10
+
+# 相位类型映射：覆盖所有可能出现的相位名称，统一为解读模板中使用的名称
+aspect_type_mapping = {
+    'Conjunction': 'conjunct',
+    'Opposition': 'opposition',
+    'Square': 'square',
+    'Trine': 'trine',
+    'Sextile': 'sextile',
+    # kerykeion aspects_list 中的名称
+    'conjunction': 'conjunct',
+    'semi-sextile': 'semi-sextile',
+    'semi-square': 'semi-square',
+    'quintile': 'quintile',
+    'sesquiquadrate': 'sesquiquadrate',
+    'biquintile': 'biquintile',
+    'quincunx': 'quincunx',
+    # 手动相位计算（ASPECT_CENTERS）中的名称
+    **{name: name for name, _ in ASPECT_CENTERS}
+}
+
+# 相位解读双向索引：(行星1, 相位, 行星2) 与 (行星2, 相位, 行星1) 均可一次查到，正向键优先
+_aspect_bidir = {}
+_aspect_names = set(aspect_type_mapping.values())
+for aspect_key, aspect_text in interpretations.get('aspects', {}).items():
+    parts = aspect_key.split('_')
+    idx = next((i for i, part in enumerate(parts) if part in _aspect_names), None)
+    if idx is None:
+        logger.warning(f"Unrecognized aspect interpretation key: {aspect_key}")
+        continue
+    _aspect_bidir[('_'.join(parts[:idx]), parts[idx], '_'.join(parts[idx + 1:]))] = aspect_text
+for (p1, aspect_name, p2), aspect_text in list(_aspect_bidir.items()):
+    _aspect_bidir.setdefault((p2, aspect_name, p1), aspect_text)
+
+def _find_aspects(positions):
+    """对一组黄经度数两两计算相位，返回 (i, j, 相位类型, 夹角) 列表，按 (i, j) 排序"""
+    pos = np.asarray(positions, dtype=float)
+    diff = np.abs(pos[:, None] - pos[None, :])
+    diff = np.minimum(diff, 360 - diff)
+    # 各相位的角度区间互不重叠，每对行星至多命中一种相位
+    aspect_idx = np.full(diff.shape, -1)
+    for k, (_, center) in enumerate(ASPECT_CENTERS):
+        aspect_idx[np.abs(diff - center) < ASPECT_ORB] = k
+    rows, cols = np.triu(aspect_idx >= 0, 1).nonzero()
+    return [
+        (int(i), int(j), ASPECT_CENTERS[aspect_idx[i, j]][0], float(diff[i, j]))
+        for i, j in zip(rows, cols)
+    ]
+
+def _interpret_planets(planets):
+    # 行星和上升星座解读
+    planet_interpretations = []
+    for planet in planets:
+        house = planet['house']
+        display_house = DISPLAY_HOUSE.get(house) or house.replace('_House', ' House')
+        if planet['name'] in interpretations['planets_in_houses'] and house in interpretations['planets_in_houses'][planet['name']]:
+            text = interpretations['planets_in_houses'][planet['name']][house]
         else:
-            # 使用城市、国家、州
-            if not country or not state or not city or not timezone:
-                return jsonify({'success': False, 'error': 'Country, state, city, and timezone are required'})
-            if country not in city_data:
-                return jsonify({'success': False, 'error': f'Country {country} not found in city data'})
-            city_info = next((c for c in city_data[country] if c['city'] == city and c['state'] == state), None)
-            if not city_info:
-                return jsonify({'success': False, 'error': f'City {city}, {state} not found in {country}'})
-            latitude = city_info['lat']
-            longitude = city_info['lng']
-
-        # 验证时区并转换为 pytz 时区
-        if timezone not in utc_to_pytz:
-            return jsonify({'success': False, 'error': f'Invalid timezone offset: {timezone}'})
-        pytz_timezone = utc_to_pytz[timezone]
-        try:
-            pytz.timezone(pytz_timezone)
-        except pytz.exceptions.UnknownTimeZoneError:
-            return jsonify({'success': False, 'error': f'Invalid pytz timezone: {pytz_timezone}'})
+            text = 'No interpretation available.'
+        planet_interpretations.append(''.join((planet['name'], ' in ', display_house, ': ', text)))
+    return planet_interpretations
 
-        # 生成星盘数据
-        try:
-            subject = AstrologicalSubject(
-                name=name,
-                year=year,
-                month=month,
-                day=day,
-                hour=hour,
-                minute=minute,
-                lng=longitude,
-                lat=latitude,
-                tz_str=pytz_timezone,
-                city=city if city else "Unknown",
-                nation=country if country else "Unknown"
-            )
-        except Exception as e:
-            logger.error(f"Failed to create AstrologicalSubject: {str(e)}")
-            return jsonify({'success': False, 'error': f'Failed to generate chart: Invalid parameters'})
+def _interpret_aspects(aspects):
+    # 相位解读
+    aspects_text = []
+    for aspect in aspects:
+        mapped_aspect = aspect_type_mapping.get(aspect['aspect'], aspect['aspect'])
+        text = _aspect_bidir.get((aspect['planet1'], mapped_aspect, aspect['planet2']), f"No interpretation available for {aspect['planet1']} {aspect['aspect']} {aspect['planet2']}.")
+        aspects_text.append(text)
+    return aspects_text
+
+# /generate-chart 请求体模型（模块加载时编译一次）
+class ChartRequest(BaseModel):
+    name: Optional[str] = 'User'
+    # strict：拒绝 12.9 之类的浮点数，而不是截断为 12
+    year: conint(strict=True, ge=1900, le=2025)
+    month: conint(strict=True, ge=1, le=12)
+    day: conint(strict=True, ge=1, le=31)
+    hour: conint(strict=True, ge=0, le=23)
+    minute: conint(strict=True, ge=0, le=59)
+    input_method: str = 'city'
+    city: Optional[str] = None
+    state: Optional[str] = None
+    country: Optional[str] = None
+    latitude: Optional[float] = None  # 范围仅在手动输入模式下校验
+    longitude: Optional[float] = None
+    timezone: Optional[str] = None  # UTC 偏移值（如 '-5'）
+
+# 字段校验失败时返回给前端的错误信息
+CHART_REQUEST_ERRORS = {
+    'year': 'Year must be between 1900 and 2025',
+    'month': 'Month must be between 1 and 12',
+    'day': 'Day must be between 1 and 31',
+    'hour': 'Hour must be between 0 and 23',
+    'minute': 'Minute must be between 0 and 59',
+    'latitude': 'Latitude must be between -90 and 90',
+    'longitude': 'Longitude must be between -180 and 180'
+}
 
-        chart = KerykeionChartSVG(subject)
+class ChartInputError(ValueError):
+    """AstrologicalSubject 无法由给定参数创建"""
+
+
+# 同一进程内的星盘数据与 SVG 两个步骤共用 AstrologicalSubject
+@functools.lru_cache(maxsize=128)
+def _build_subject(chart_key):
+    name, year, month, day, hour, minute, latitude, longitude, pytz_timezone, city, nation = chart_key
+    try:
+        return AstrologicalSubject(
+            name=name,
+            year=year,
+            month=month,
+            day=day,
+            hour=hour,
+            minute=minute,
+            lng=longitude,
+            lat=latitude,
+            tz_str=pytz_timezone,
+            city=city,
+            nation=nation
+        )
+    except Exception as e:
+        logger.error(f"Failed to create AstrologicalSubject: {str(e)}")
+        raise ChartInputError(str(e)) from e
+
+def _render_svg(chart_key):
+    # 星盘 SVG 由输入完全决定，命中磁盘缓存时跳过渲染
+    svg_key = hashlib.blake2b(repr(chart_key).encode('utf-8'), digest_size=16).hexdigest()
+    svg_data = _svg_cache_get(svg_key)
+    if svg_data is None:
+        chart = KerykeionChartSVG(_build_subject(chart_key))
         svg_data = chart.makeTemplate()
+        _svg_cache_set(svg_key, svg_data)
+    return svg_data
 
-        # 手动构建行星数据（包括上升星座）
-        planets = [
-            {'name': 'Ascendant', 'sign': subject.first_house.sign, 'degree': subject.first_house.position, 'house': 'First_House'},
-            {'name': 'Sun', 'sign': subject.sun.sign, 'degree': subject.sun.position, 'house': subject.sun.house},
-            {'name': 'Moon', 'sign': subject.moon.sign, 'degree': subject.moon.position, 'house': subject.moon.house},
-            {'name': 'Mercury', 'sign': subject.mercury.sign, 'degree': subject.mercury.position, 'house': subject.mercury.house},
-            {'name': 'Venus', 'sign': subject.venus.sign, 'degree': subject.venus.position, 'house': subject.venus.house},
-            {'name': 'Mars', 'sign': subject.mars.sign, 'degree': subject.mars.position, 'house': subject.mars.house},
-            {'name': 'Jupiter', 'sign': subject.jupiter.sign, 'degree': subject.jupiter.position, 'house': subject.jupiter.house},
-            {'name': 'Saturn', 'sign': subject.saturn.sign, 'degree': subject.saturn.position, 'house': subject.saturn.house},
-            {'name': 'Uranus', 'sign': subject.uranus.sign, 'degree': subject.uranus.position, 'house': subject.uranus.house},
-            {'name': 'Neptune', 'sign': subject.neptune.sign, 'degree': subject.neptune.position, 'house': subject.neptune.house},
-            {'name': 'Pluto', 'sign': subject.pluto.sign, 'degree': subject.pluto.position, 'house': subject.pluto.house}
+def _astro_key(chart_key):
+    # 星盘缓存键中的天文部分：(年, 月, 日, 时, 分, 纬度, 经度, 时区)，不含姓名和地名
+    return chart_key[1:9]
+
+# 星盘数据（不含 SVG）只由天文部分决定，仅按 astro_key 缓存；chart_key 只用于构造 AstrologicalSubject
+@cache.memoize(args_to_ignore=['chart_key'])
+def _compute_chart(astro_key, chart_key):
+    subject = _build_subject(chart_key)
+
+    # 手动构建行星数据（包括上升星座）
+    planets = [{'name': PLANET_NAMES[0], 'sign': subject.first_house.sign, 'degree': subject.first_house.position, 'house': HOUSE_NAMES['First']}]
+    planets += [
+        {'name': name, 'sign': point.sign, 'degree': point.position, 'house': point.house}
+        for attr, name in zip(PLANET_ATTRS, PLANET_NAMES[1:]) for point in (getattr(subject, attr),)
+    ]
+
+    # 清理宫位名称
+    for planet in planets:
+        if planet['name'] != 'Ascendant':
+            prefix = planet['house'].split('_', 1)[0]
+            planet['house'] = HOUSE_NAMES.get(prefix, planet['house'])
+
+    # 提取宫位数据
+    try:
+        houses = [
+            {
+                'house': i + 1,
+                'sign': house['sign'],
+                'degree': house['position']
+            } for i, house in enumerate(subject.houses_list)
         ]
+    except AttributeError:
+        logger.warning("subject.houses_list not found. Skipping houses data.")
+        houses = []
 
-        # 清理宫位名称
-        house_names = {
-            'First': 'First_House', 'Second': 'Second_House', 'Third': 'Third_House', 'Fourth': 'Fourth_House',
-            'Fifth': 'Fifth_House', 'Sixth': 'Sixth_House', 'Seventh': 'Seventh_House', 'Eighth': 'Eighth_House',
-            'Ninth': 'Ninth_House', 'Tenth': 'Tenth_House', 'Eleventh': 'Eleventh_House', 'Twelfth': 'Twelfth_House'
-        }
-        for planet in planets:
-            if planet['name'] != 'Ascendant':
-                for key, value in house_names.items():
-                    if planet['house'].startswith(key):
-                        planet['house'] = value
-                        break
-
-        # 提取宫位数据
-        try:
-            houses = [
-                {
-                    'house': i + 1,
-                    'sign': house['sign'],
-                    'degree': house['position']
-                } for i, house in enumerate(subject.houses_list)
-            ]
-        except AttributeError:
-            logger.warning("subject.houses_list not found. Skipping houses data.")
-            houses = []
-
-        # 相位类型映射
-        aspect_type_mapping = {
-            'Conjunction': 'conjunct',
-            'Opposition': 'opposition',
-            'Square': 'square',
-            'Trine': 'trine',
-            'Sextile': 'sextile'
-        }
-
-        # 使用 kerykeion 的内置相位计算
-        aspects = []
-        try:
-            for aspect in subject.aspects_list:
-                aspects.append({
-                    'planet1': aspect['p1_name'],
-                    'planet2': aspect['p2_name'],
-                    'aspect': aspect['aspect_type'],
-                    'orb': aspect['orb']
-                })
-        except AttributeError:
-            logger.warning("subject.aspects_list not found. Using manual aspect calculation.")
-            planet_list = [subject.first_house, subject.sun, subject.moon, subject.mercury, subject.venus, subject.mars,
-                           subject.jupiter, subject.saturn, subject.uranus, subject.neptune, subject.pluto]
-            planet_names = ['Ascendant', 'Sun', 'Moon', 'Mercury', 'Venus', 'Mars', 'Jupiter', 'Saturn', 'Uranus', 'Neptune', 'Pluto']
-            for i, p1 in enumerate(planet_list):
-                for j, p2 in enumerate(planet_list[i+1:], start=i+1):
-                    angle = abs(p1.position - p2.position)
-                    if angle > 180: angle = 360 - angle
-                    orb = angle
-                    aspect_type = None
-                    if orb < 10:
-                        aspect_type = 'conjunct'
-                    elif abs(orb - 180) < 10:
-                        aspect_type = 'opposition'
-                    elif abs(orb - 90) < 10:
-                        aspect_type = 'square'
-                    elif abs(orb - 120) < 10:
-                        aspect_type = 'trine'
-                    elif abs(orb - 60) < 10:
-                        aspect_type = 'sextile'
-                    if aspect_type:
-                        aspects.append({
-                            'planet1': planet_names[i],
-                            'planet2': planet_names[j],
-                            'aspect': aspect_type,
-                            'orb': orb
-                        })
-
-        # 调试相位计算
+    # 使用 kerykeion 的内置相位计算
+    aspects = []
+    try:
+        for aspect in subject.aspects_list:
+            aspects.append({
+                'planet1': aspect['p1_name'],
+                'planet2': aspect['p2_name'],
+                'aspect': aspect['aspect_type'],
+                'orb': aspect['orb']
+            })
+    except AttributeError:
+        logger.warning("subject.aspects_list not found. Using manual aspect calculation.")
+        planet_list = [subject.first_house, subject.sun, subject.moon, subject.mercury, subject.venus, subject.mars,
+                       subject.jupiter, subject.saturn, subject.uranus, subject.neptune, subject.pluto]
+        # 使用黄道绝对经度（abs_pos），与批量星盘的计算保持一致
+        for i, j, aspect_type, orb in _find_aspects([p.abs_pos for p in planet_list]):
+            aspects.append({
+                'planet1': PLANET_NAMES[i],
+                'planet2': PLANET_NAMES[j],
+                'aspect': aspect_type,
+                'orb': orb
+            })
+
+    # 调试相位计算
+    if logger.isEnabledFor(logging.DEBUG):
         logger.debug("Calculated Aspects: %s", [
             f"{aspect['planet1']} {aspect['aspect']} {aspect['planet2']} (Orb: {aspect['orb']:.2f}°)"
             for aspect in aspects
         ])
 
-        # 行星和上升星座解读
-        planet_interpretations = []
-        for planet in planets:
-            house = planet['house']
-            display_house = house.replace('_House', ' House')
-            if planet['name'] in interpretations['planets_in_houses'] and house in interpretations['planets_in_houses'][planet['name']]:
-                text = interpretations['planets_in_houses'][planet['name']][house]
-                planet_interpretations.append(f"{planet['name']} in {display_house}: {text}")
-            else:
-                planet_interpretations.append(f"{planet['name']} in {display_house}: No interpretation available.")
-
-        # 相位解读
-        aspect_interpretations = interpretations.get('aspects', {})
-        logger.debug("Available aspect keys: %s", list(aspect_interpretations.keys()))
-        aspects_text = []
-        for aspect in aspects:
-            mapped_aspect = aspect_type_mapping.get(aspect['aspect'], aspect['aspect'].lower())
-            specific_key = f"{aspect['planet1']}_{mapped_aspect}_{aspect['planet2']}"
-            reverse_key = f"{aspect['planet2']}_{mapped_aspect}_{aspect['planet1']}"
-            text = aspect_interpretations.get(specific_key) or aspect_interpretations.get(reverse_key, f"No interpretation available for {aspect['planet1']} {aspect['aspect']} {aspect['planet2']}.")
-            aspects_text.append(text)
-
-        # 调试输出
-        logger.debug("Planets: %s", planets)
-        logger.debug("Houses: %s", houses)
-        logger.debug("Aspects: %s", aspects)
-        logger.debug("Planet Interpretations: %s", planet_interpretations)
-        logger.debug("Aspects Text: %s", aspects_text)
-        logger.debug("Available Planet Interpretations: %s", {planet: list(houses.keys()) for planet, houses in interpretations['planets_in_houses'].items()})
-        logger.debug("Available Aspects: %s", list(aspect_interpretations.keys()))
+    planet_interpretations = _interpret_planets(planets)
+    aspects_text = _interpret_aspects(aspects)
 
-        return jsonify({
+    # 调试输出
+    logger.debug("Planets: %s", planets)
+    logger.debug("Houses: %s", houses)
+    logger.debug("Aspects: %s", aspects)
+    logger.debug("Planet Interpretations: %s", planet_interpretations)
+    logger.debug("Aspects Text: %s", aspects_text)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Available Planet Interpretations: %s", {planet: list(planet_houses.keys()) for planet, planet_houses in interpretations['planets_in_houses'].items()})
+        logger.debug("Available Aspects: %s", list(interpretations.get('aspects', {}).keys()))
+
+    return {
+        'success': True,
+        'planets': planets,
+        'houses': houses,
+        'aspects': aspects,
+        'planet_interpretations': planet_interpretations,
+        'aspects_text': aspects_text
+    }
+
+
+def _parse_chart_request(data):
+    """验证单个星盘请求，返回 (星盘缓存键, None) 或 (None, 错误信息)"""
+    # 验证年份、月份、日期和时间
+    try:
+        req = ChartRequest(**data)
+    except ValidationError as e:
+        error = e.errors()[0]
+        field = error['loc'][0] if error['loc'] else None
+        return None, CHART_REQUEST_ERRORS.get(field, error['msg'])
+    name = req.name
+    year, month, day = req.year, req.month, req.day
+    hour, minute = req.hour, req.minute
+    input_method = req.input_method
+    city, state, country = req.city, req.state, req.country
+    latitude, longitude = req.latitude, req.longitude
+    timezone = req.timezone
+
+    # 验证日期有效性
+    try:
+        datetime(year, month, day)
+    except ValueError:
+        return None, 'Invalid date'
+
+    # 处理位置信息
+    if input_method == 'manual':
+        if latitude is None or longitude is None or not timezone:
+            return None, 'Latitude, longitude, and timezone are required for manual input'
+        if not (-90 <= latitude <= 90):
+            return None, CHART_REQUEST_ERRORS['latitude']
+        if not (-180 <= longitude <= 180):
+            return None, CHART_REQUEST_ERRORS['longitude']
+    else:
+        # 使用城市、国家、州
+        if not country or not state or not city or not timezone:
+            return None, 'Country, state, city, and timezone are required'
+        if country not in city_index:
+            return None, f'Country {country} not found in city data'
+        city_info = city_index[country].get((state, city))
+        if not city_info:
+            return None, f'City {city}, {state} not found in {country}'
+        latitude = city_info['lat']
+        longitude = city_info['lng']
+
+    # 验证时区并转换为 pytz 时区
+    tz_obj = utc_to_tz.get(timezone)
+    if tz_obj is None:
+        return None, f'Invalid timezone offset: {timezone}'
+    pytz_timezone = tz_obj.zone
+
+    # 星盘缓存键：经纬度统一保留 4 位小数
+    key = (name, year, month, day, hour, minute, round(float(latitude), 4), round(float(longitude), 4),
+           pytz_timezone, city if city else "Unknown", country if country else "Unknown")
+    return key, None
+
+# 正在计算中的星盘数据/SVG：相同输入的并发请求只计算一次，其余等待共享结果
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+def _run_once(func, *args):
+    # 以第一个参数作为去重键
+    inflight_key = (func.__name__, args[0])
+    with _inflight_lock:
+        entry = _inflight.get(inflight_key)
+        is_leader = entry is None
+        if is_leader:
+            entry = _inflight[inflight_key] = {'event': threading.Event()}
+    if not is_leader:
+        entry['event'].wait()
+        if 'error' in entry:
+            raise entry['error']
+        return entry['result']
+    try:
+        entry['result'] = func(*args)
+        return entry['result']
+    except Exception as e:
+        entry['error'] = e
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(inflight_key, None)
+        entry['event'].set()
+
+# 批量星盘：直接调用 Swiss Ephemeris，不构造 AstrologicalSubject，也不渲染 SVG
+SWE_PLANET_IDS = (swe.SUN, swe.MOON, swe.MERCURY, swe.VENUS, swe.MARS,
+                  swe.JUPITER, swe.SATURN, swe.URANUS, swe.NEPTUNE, swe.PLUTO)
+SIGN_NAMES = tuple(sys.intern(sign) for sign in ('Ari', 'Tau', 'Gem', 'Can', 'Leo', 'Vir', 'Lib', 'Sco', 'Sag', 'Cap', 'Aqu', 'Pis'))
+BATCH_MAX_CHARTS = 100
+
+def _ephemeris_batch(chart_keys):
+    """返回 (N, 11) 的上升点与行星黄经数组、(N, 12) 的宫头黄经数组（Placidus 宫制）和 (N,) 的失败标记"""
+    longitudes = np.zeros((len(chart_keys), len(PLANET_NAMES)))
+    cusps = np.zeros((len(chart_keys), 12))
+    failed = np.zeros(len(chart_keys), dtype=bool)
+    for c, chart_key in enumerate(chart_keys):
+        _, year, month, day, hour, minute, latitude, longitude, pytz_timezone, _, _ = chart_key
+        try:
+            local_dt = zone_to_tz[pytz_timezone].localize(datetime(year, month, day, hour, minute))
+            utc_dt = local_dt.astimezone(pytz.utc)
+            jd = swe.julday(utc_dt.year, utc_dt.month, utc_dt.day, utc_dt.hour + utc_dt.minute / 60)
+            house_cusps, ascmc = swe.houses(jd, latitude, longitude, b'P')
+            cusps[c] = house_cusps[:12]
+            longitudes[c, 0] = ascmc[0]
+            for p, planet_id in enumerate(SWE_PLANET_IDS, start=1):
+                longitudes[c, p] = swe.calc_ut(jd, planet_id)[0][0]
+        except Exception as e:
+            # 单个星盘失败（如极圈内无法计算 Placidus 宫位）不影响同批其他星盘
+            logger.error(f"Failed to compute batch chart {chart_key}: {str(e)}")
+            longitudes[c] = 0
+            cusps[c] = 0
+            failed[c] = True
+    return longitudes, cusps, failed
+
+def _compute_charts_batch(chart_keys):
+    longitudes, cusps, failed = _ephemeris_batch(chart_keys)
+
+    # 星座、星座内度数和所在宫位整体向量化计算：行星落在其后方最近的宫头所在的宫
+    point_signs = (longitudes // 30).astype(int) % 12
+    point_degrees = longitudes % 30
+    point_houses = np.argmin((longitudes[:, :, None] - cusps[:, None, :]) % 360, axis=2)
+    cusp_signs = (cusps // 30).astype(int) % 12
+    cusp_degrees = cusps % 30
+    house_order = tuple(HOUSE_NAMES.values())
+
+    results = []
+    for c in range(len(chart_keys)):
+        if failed[c]:
+            results.append({'success': False, 'error': 'Failed to generate chart: Invalid parameters'})
+            continue
+        planets = [
+            {
+                'name': name,
+                'sign': SIGN_NAMES[point_signs[c, p]],
+                'degree': float(point_degrees[c, p]),
+                'house': house_order[point_houses[c, p]]
+            } for p, name in enumerate(PLANET_NAMES)
+        ]
+        houses = [
+            {
+                'house': h + 1,
+                'sign': SIGN_NAMES[cusp_signs[c, h]],
+                'degree': float(cusp_degrees[c, h])
+            } for h in range(12)
+        ]
+        aspects = [
+            {
+                'planet1': PLANET_NAMES[i],
+                'planet2': PLANET_NAMES[j],
+                'aspect': aspect_type,
+                'orb': orb
+            } for i, j, aspect_type, orb in _find_aspects(longitudes[c])
+        ]
+        results.append({
             'success': True,
-            'svg': svg_data,
             'planets': planets,
             'houses': houses,
             'aspects': aspects,
-            'planet_interpretations': planet_interpretations,
-            'aspects_text': aspects_text
+            'planet_interpretations': _interpret_planets(planets),
+            'aspects_text': _interpret_aspects(aspects)
         })
+    return results
+
+
+@app.route('/generate-chart', methods=['POST'])
+def generate_chart():
+    try:
+        # 接收并验证前端信息
+        data = request.json
+        key, error = _parse_chart_request(data)
+        if error:
+            return jsonify({'success': False, 'error': error})
+        # 仅需行星/相位数据的客户端可传 include_svg=false 跳过 SVG 渲染（返回 svg: null）
+        include_svg = data.get('include_svg', True)
+        if not isinstance(include_svg, bool):
+            return jsonify({'success': False, 'error': 'include_svg must be a boolean'})
+
+        # 生成星盘数据（相同输入直接命中缓存）
+        try:
+            result = _run_once(_compute_chart, _astro_key(key), key)
+            svg_data = _run_once(_render_svg, key) if include_svg else None
+        except ChartInputError:
+            return jsonify({'success': False, 'error': 'Failed to generate chart: Invalid parameters'})
+
+        return jsonify({'success': True, 'svg': svg_data, **result})
     except Exception as e:
         logger.error("Error in generate_chart: %s", str(e))
         return jsonify({
@@ -314,6 +616,54 @@ def generate_chart():
             'error': str(e)
         })
 
+# 单独获取星盘 SVG（配合 include_svg=false 延迟加载），与 /generate-chart 共用 SVG 磁盘缓存
+@app.route('/chart-svg', methods=['POST'])
+def chart_svg():
+    try:
+        key, error = _parse_chart_request(request.json)
+        if error:
+            return jsonify({'success': False, 'error': error})
+        try:
+            svg_data = _run_once(_render_svg, key)
+        except ChartInputError:
+            return jsonify({'success': False, 'error': 'Failed to generate chart: Invalid parameters'})
+
+        return jsonify({'success': True, 'svg': svg_data})
+    except Exception as e:
+        logger.error("Error in chart_svg: %s", str(e))
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+
+@app.route('/generate-charts-batch', methods=['POST'])
+def generate_charts_batch():
+    try:
+        charts = (request.json or {}).get('charts')
+        if not isinstance(charts, list) or not charts:
+            return jsonify({'success': False, 'error': 'charts must be a non-empty list'})
+        if len(charts) > BATCH_MAX_CHARTS:
+            return jsonify({'success': False, 'error': f'At most {BATCH_MAX_CHARTS} charts per request'})
+
+        # 逐个验证，合法的请求一起计算，非法的在原位置返回错误
+        parsed = [
+            _parse_chart_request(chart) if isinstance(chart, dict) else (None, 'Invalid chart request')
+            for chart in charts
+        ]
+        computed = iter(_compute_charts_batch([key for key, error in parsed if not error]))
+        results = [
+            {'success': False, 'error': error} if error else next(computed)
+            for key, error in parsed
+        ]
+        return jsonify({'success': True, 'charts': results})
+    except Exception as e:
+        logger.error("Error in generate_charts_batch: %s", str(e))
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
+    # 仅用于本地开发；生产环境使用 gunicorn（见 gunicorn.conf.py）
+    app.run(host='0.0.0.0', port=port, debug=os.environ.get('FLASK_DEBUG') == '1')
\ No newline at end of file
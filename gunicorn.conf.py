@@ -0,0 +1,18 @@
+# gunicorn 配置（在项目目录下运行 `gunicorn app:app` 时自动加载）
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = 2
+
+# 预加载应用：解读模板、城市索引等启动数据在 worker 间写时复制共享
+preload_app = True
+
+
+def post_fork(server, worker):
+    # 磁盘缓存的 SQLite 连接不能跨进程复用，fork 后关闭，由 worker 按需重新打开
+    from app import svg_cache
+    if svg_cache is not None:
+        svg_cache.close()
@@ -0,0 +1,31 @@
+# 在项目根目录运行：python -m pytest -q
+import pytest
+
+from app import app
+
+CHART = {
+    'name': 'Test',
+    'year': 1990,
+    'month': 6,
+    'day': 15,
+    'hour': 14,
+    'minute': 30,
+    'input_method': 'manual',
+    'latitude': 40.7128,
+    'longitude': -74.006,
+    'timezone': '-5'
+}
+
+
+def test_single_and_batch_aspects_match():
+    client = app.test_client()
+    single = client.post('/generate-chart', json={**CHART, 'include_svg': False}).get_json()
+    batch = client.post('/generate-charts-batch', json={'charts': [CHART]}).get_json()['charts'][0]
+    assert single['success'] and batch['success']
+
+    def aspect_names(aspects):
+        return [(a['planet1'], a['aspect'], a['planet2']) for a in aspects]
+
+    assert aspect_names(single['aspects']) == aspect_names(batch['aspects'])
+    assert [a['orb'] for a in single['aspects']] == pytest.approx([a['orb'] for a in batch['aspects']], abs=1e-3)
+    assert single['aspects_text'] == batch['aspects_text']